@@ -1,8 +1,11 @@
 from flask import Flask, render_template, request, flash, redirect, url_for, session, jsonify
+from markupsafe import Markup
 import joblib
-import pandas as pd
+import numpy as np
+from numba import njit, prange
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 import logging
 
 # Configuração de logging
@@ -26,11 +29,35 @@ class Config:
         'monetary': {'min': 0.01, 'max': MAX_MONETARY}
     }
 
+# --- Kernel de predição em lote ---
+@njit(parallel=True, fastmath=True, cache=True)
+def _predict_batch(X, mean, scale, centers):
+    """Retorna o índice do centróide mais próximo para cada linha (R, F, M) de X"""
+    n, k = X.shape[0], centers.shape[0]
+    out = np.empty(n, np.int32)
+    for i in prange(n):
+        best_d = 1e30
+        best_j = 0
+        for j in range(k):
+            d = 0.0
+            for f in range(3):
+                v = (X[i, f] - mean[f]) / scale[f] - centers[j, f]
+                d += v * v
+            if d < best_d:
+                best_d = d
+                best_j = j
+        out[i] = best_j
+    return out
+
 # --- Carregamento dos Modelos ---
 class ModelManager:
     def __init__(self):
         self.rfm_scaler = None
         self.rfm_kmeans_model = None
+        self._mean = None
+        self._scale = None
+        self._centers = None
+        self._predict_cached = None
         self.models_loaded = False
         self.load_models()
     
@@ -44,8 +71,17 @@ class ModelManager:
                 logger.error(f"Arquivos de modelo não encontrados em {Config.MODELS_PATH}/")
                 return False
             
-            self.rfm_scaler = joblib.load(scaler_path)
-            self.rfm_kmeans_model = joblib.load(kmeans_path)
+            # mmap_mode mapeia os arrays NumPy dos modelos em vez de copiá-los
+            self.rfm_scaler = joblib.load(scaler_path, mmap_mode='r')
+            self.rfm_kmeans_model = joblib.load(kmeans_path, mmap_mode='r')
+            
+            # Pré-calcula os parâmetros do scaler e os centróides para a predição
+            self._mean = np.ascontiguousarray(self.rfm_scaler.mean_, dtype=np.float32)
+            self._scale = np.ascontiguousarray(self.rfm_scaler.scale_, dtype=np.float32)
+            self._centers = np.ascontiguousarray(self.rfm_kmeans_model.cluster_centers_, dtype=np.float32)
+            
+            # Cache de predições próprio desta instância, recriado a cada carga dos modelos
+            self._predict_cached = lru_cache(maxsize=8192)(self._predict_from_cents)
             
             logger.info("✅ Modelos RFM carregados com sucesso")
             self.models_loaded = True
@@ -56,18 +92,53 @@ class ModelManager:
             self.models_loaded = False
             return False
     
+    def warm_up(self):
+        """
+        Aquece (compila) o kernel de predição em lote; falhas são apenas registradas
+        
+        Não é chamado no import: o kernel paralelo inicia o pool de threads do
+        Numba, que não pode existir no mestre do gunicorn antes do fork
+        (ver post_fork em gunicorn.conf.py).
+        """
+        if not self.models_loaded:
+            return False
+        
+        # Fora do try de load_models: um problema no kernel (compilação, cache do
+        # Numba) não pode derrubar a predição unitária, que não depende dele
+        try:
+            _predict_batch(np.zeros((1, 3), dtype=np.float32), self._mean, self._scale, self._centers)
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Kernel de predição em lote indisponível: {e}")
+            return False
+    
     def predict_cluster(self, recency, frequency, monetary):
         """Prediz o cluster RFM para um cliente"""
         if not self.models_loaded:
             raise ValueError("Modelos não carregados")
         
-        customer_data = pd.DataFrame([[recency, frequency, monetary]],
-                                   columns=['Recency', 'Frequency', 'Monetary'])
+        # Entradas repetidas são respondidas pelo cache (monetário em centavos)
+        return self._predict_cached(int(round(recency)), int(round(frequency)), int(round(monetary * 100)))
+    
+    def _predict_from_cents(self, recency, frequency, monetary_cents):
+        """Predição pelo trio (recência, frequência, monetário em centavos), chave do cache"""
+        return self._nearest_cluster(recency, frequency, monetary_cents / 100)
+    
+    def _nearest_cluster(self, recency, frequency, monetary):
+        """Escala e busca o centróide mais próximo sem passar pelo pandas/sklearn"""
+        x = np.array([recency, frequency, monetary], dtype=np.float32)
+        x_scaled = (x - self._mean) / self._scale
+        distances = ((self._centers - x_scaled) ** 2).sum(axis=1)
         
-        customer_scaled = self.rfm_scaler.transform(customer_data)
-        predicted_cluster = self.rfm_kmeans_model.predict(customer_scaled)[0]
+        return int(distances.argmin())
+    
+    def predict_clusters(self, rfm_values):
+        """Prediz os clusters RFM para um lote de clientes (N x 3: Recency, Frequency, Monetary)"""
+        if not self.models_loaded:
+            raise ValueError("Modelos não carregados")
         
-        return int(predicted_cluster)
+        X = np.ascontiguousarray(rfm_values, dtype=np.float32).reshape(-1, 3)
+        return _predict_batch(X, self._mean, self._scale, self._centers)
 
 # Instância global do gerenciador de modelos
 model_manager = ModelManager()
@@ -116,20 +187,44 @@ CLUSTER_DEFINITIONS = {
     }
 }
 
+def render_cluster_card(cluster_id, cluster_info):
+    """Renderiza o cartão HTML de resultado de um cluster"""
+    return Markup(render_template('cluster_card.html', cluster_id=cluster_id, cluster_info=cluster_info))
+
+# Cartões dos clusters conhecidos renderizados uma única vez por processo
+with app.app_context():
+    CLUSTER_CARDS_HTML = {
+        cluster_id: render_cluster_card(cluster_id, cluster_info)
+        for cluster_id, cluster_info in CLUSTER_DEFINITIONS.items()
+    }
+
+# Limites de validação pré-calculados (ordem: recência, frequência, monetário)
+_VALIDATION_FIELDS = ('recency', 'frequency', 'monetary')
+_VALIDATION_LO = np.array([Config.VALIDATION_RULES[f]['min'] for f in _VALIDATION_FIELDS], dtype=np.float64)
+_VALIDATION_HI = np.array([Config.VALIDATION_RULES[f]['max'] for f in _VALIDATION_FIELDS], dtype=np.float64)
+
 def validate_input(recency, frequency, monetary):
     """Valida os inputs do usuário"""
+    values = np.array([recency, frequency, monetary], dtype=np.float64)
+    # Máscara "dentro dos limites" (NaN é rejeitado, pois toda comparação falha)
+    in_range = (values >= _VALIDATION_LO) & (values <= _VALIDATION_HI)
+    
+    # Caminho rápido: todos os valores dentro dos limites
+    if in_range.all():
+        return []
+    
     errors = []
     
     # Validação de recência
-    if not (Config.VALIDATION_RULES['recency']['min'] <= recency <= Config.VALIDATION_RULES['recency']['max']):
+    if not in_range[0]:
         errors.append(f"Recência deve estar entre {Config.VALIDATION_RULES['recency']['min']} e {Config.VALIDATION_RULES['recency']['max']} dias")
     
     # Validação de frequência
-    if not (Config.VALIDATION_RULES['frequency']['min'] <= frequency <= Config.VALIDATION_RULES['frequency']['max']):
+    if not in_range[1]:
         errors.append(f"Frequência deve estar entre {Config.VALIDATION_RULES['frequency']['min']} e {Config.VALIDATION_RULES['frequency']['max']} pedidos")
     
     # Validação de valor monetário
-    if not (Config.VALIDATION_RULES['monetary']['min'] <= monetary <= Config.VALIDATION_RULES['monetary']['max']):
+    if not in_range[2]:
         errors.append(f"Valor monetário deve estar entre £{Config.VALIDATION_RULES['monetary']['min']:.2f} e £{Config.VALIDATION_RULES['monetary']['max']:.2f}")
     
     return errors
@@ -138,6 +233,7 @@ def validate_input(recency, frequency, monetary):
 def index():
     """Rota principal da aplicação"""
     prediction_result = None
+    cluster_card_html = None
     
     if request.method == 'POST':
         try:
@@ -175,6 +271,11 @@ def index():
                 "icon": "❓"
             })
             
+            cluster_card_html = CLUSTER_CARDS_HTML.get(predicted_cluster)
+            if cluster_card_html is None:
+                cluster_card_html = render_cluster_card(predicted_cluster, cluster_info)
+            
+            now = datetime.now()
             prediction_result = {
                 'cluster_id': predicted_cluster,
                 'cluster_info': cluster_info,
@@ -183,7 +284,7 @@ def index():
                     'frequency': frequency,
                     'monetary': monetary
                 },
-                'timestamp': datetime.now().strftime("%d/%m/%Y às %H:%M")
+                'timestamp': f"{now.day:02d}/{now.month:02d}/{now.year} às {now.hour:02d}:{now.minute:02d}"
             }
             
             flash(f"✅ Análise realizada com sucesso! Cliente classificado como: {cluster_info['name']}", "success")
@@ -197,6 +298,7 @@ def index():
     
     return render_template('index.html', 
                          prediction_result=prediction_result,
+                         cluster_card_html=cluster_card_html,
                          cluster_definitions=CLUSTER_DEFINITIONS,
                          models_available=model_manager.models_loaded,
                          config=Config)
@@ -234,7 +336,7 @@ def api_predict():
             'cluster_name': cluster_info['name'],
             'description': cluster_info['description'],
             'strategy': cluster_info['strategy'],
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now(tz=timezone.utc).isoformat(timespec='seconds')
         })
         
     except Exception as e:
@@ -265,9 +367,11 @@ if __name__ == '__main__':
     print("🚀 Iniciando aplicação RFM Customer Segmentation...")
     print(f"📁 Procurando modelos em: {Config.MODELS_PATH}/")
     print(f"🔧 Modelos carregados: {'✅' if model_manager.models_loaded else '❌'}")
+    model_manager.warm_up()
     
+    # Servidor de desenvolvimento; em produção use: gunicorn -c app/gunicorn.conf.py app:app
     app.run(
-        debug=True,
+        debug=os.environ.get('FLASK_DEV', '0') == '1',
         host='0.0.0.0',
         port=5000
     )
\ No newline at end of file
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do Gunicorn para a aplicação RFM
+Uso (a partir da raiz do projeto): gunicorn -c app/gunicorn.conf.py app:app
+"""
+
+import os
+
+# Diretório da aplicação no sys.path; modelos continuam relativos à raiz
+pythonpath = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', os.cpu_count() or 1))
+worker_class = 'sync'
+
+# Carrega a aplicação (e o ModelManager) uma única vez no processo mestre;
+# os workers herdam os arrays dos modelos via páginas copy-on-write do fork
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Compila o kernel de predição em lote em cada worker, já após o fork"""
+    # No mestre o pool de threads do Numba travaria o encerramento dos workers
+    from app import model_manager
+    model_manager.warm_up()
@@ -4,11 +4,18 @@ Data Cleaner Module
 Módulo responsável pela limpeza e pré-processamento dos dados de transações
 """
 
+import os
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
 from sklearn.base import BaseEstimator, TransformerMixin
 
 
+# Colunas necessárias para o pipeline RFM e seus tipos na leitura
+RFM_COLUMNS = ['InvoiceNo', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID']
+RFM_DTYPES = {'Quantity': 'int32', 'UnitPrice': 'float32', 'CustomerID': 'Int32'}
+
+
 class DataCleanerTransformer(BaseEstimator, TransformerMixin):
     """
     Transformador para limpar e filtrar o DataFrame de transações.
@@ -20,46 +27,132 @@ class DataCleanerTransformer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X, y=None):
-        df_cleaned = X.copy()
-
-        # Removendo transações canceladas
-        df_cleaned = df_cleaned[~df_cleaned['InvoiceNo'].astype(str).str.contains('C', na=False)].copy()
-
-        # Removendo registros com CustomerID ausente
-        df_cleaned.dropna(subset=['CustomerID'], inplace=True)
-        df_cleaned['CustomerID'] = df_cleaned['CustomerID'].astype(int)
-
-        # Removendo transações com quantidade ou preço <= 0
-        df_cleaned = df_cleaned[(df_cleaned['Quantity'] > 0) & (df_cleaned['UnitPrice'] > 0)].copy()
+        # Filtros combinados em uma única máscara: cancelamentos (prefixo 'C'),
+        # CustomerID ausente e quantidade ou preço <= 0
+        keep = (
+            ~X['InvoiceNo'].astype('string').str.startswith('C', na=False)
+            & X['CustomerID'].notna()
+            & (X['Quantity'] > 0)
+            & (X['UnitPrice'] > 0)
+        )
+        df_cleaned = X.loc[keep]
 
         # Convertendo InvoiceDate para datetime
         df_cleaned['InvoiceDate'] = pd.to_datetime(df_cleaned['InvoiceDate'])
 
+        # Reduzindo os tipos numéricos para diminuir o uso de memória
+        # (com Copy-on-Write, sem cópia quando a leitura já entregou os tipos compactos)
+        df_cleaned['Quantity'] = df_cleaned['Quantity'].astype(np.int32)
+        df_cleaned['UnitPrice'] = df_cleaned['UnitPrice'].astype(np.float32)
+        df_cleaned['CustomerID'] = df_cleaned['CustomerID'].astype(np.int32)
+
         # Criando TotalPrice
-        df_cleaned['TotalPrice'] = df_cleaned['Quantity'] * df_cleaned['UnitPrice']
+        df_cleaned['TotalPrice'] = df_cleaned['Quantity'].to_numpy(dtype=np.float32) * df_cleaned['UnitPrice'].to_numpy()
+
+        # Ordenando por cliente para agrupamentos em blocos contíguos
+        df_cleaned = df_cleaned.sort_values('CustomerID', kind='stable')
+
+        # Colunas de baixa cardinalidade como categóricas
+        df_cleaned['InvoiceNo'] = df_cleaned['InvoiceNo'].astype('category')
+        if 'Country' in df_cleaned.columns:
+            df_cleaned['Country'] = df_cleaned['Country'].astype('category')
 
         return df_cleaned
 
 
-def load_online_retail_data(file_path="data/Online Retail.xlsx"):
+def load_online_retail_data(file_path="data/Online Retail.xlsx", columns=None):
     """
     Carrega o dataset Online Retail
     
+    Na primeira leitura o Excel é convertido para um cache em parquet
+    (mesmo caminho, extensão .parquet), usado nas execuções seguintes
+    enquanto não for mais antigo que o arquivo original.
+    Uma lista de arquivos (partes .xlsx/.csv do dataset) é carregada em
+    paralelo e concatenada em um único DataFrame; nesse modo um arquivo
+    ausente aborta o carregamento (sem dados simulados).
+    
+    Args:
+        file_path (str | list): Caminho para o arquivo Excel ou lista de arquivos
+        columns (list): Colunas a carregar (padrão: apenas as usadas no RFM)
+        
+    Returns:
+        pd.DataFrame: Dataset carregado ou None se houver erro
+    """
+    if columns is None:
+        columns = RFM_COLUMNS
+
+    if isinstance(file_path, (list, tuple)):
+        dfs = Parallel(n_jobs=-1, backend='loky')(
+            delayed(_load_single_file)(path, columns, simulate_if_missing=False) for path in file_path
+        )
+        if any(df is None for df in dfs):
+            print("Erro: Não foi possível carregar todos os arquivos.")
+            return None
+
+        df = pd.concat(dfs, ignore_index=True)
+        print(f"{len(dfs)} arquivos carregados e concatenados.")
+        print(f"Shape: {df.shape}")
+        return df
+
+    return _load_single_file(file_path, columns)
+
+
+def _load_single_file(file_path, columns, simulate_if_missing=True):
+    """
+    Carrega um único arquivo do dataset (Excel ou CSV), usando o cache parquet
+    
     Args:
-        file_path (str): Caminho para o arquivo Excel
+        file_path (str): Caminho para o arquivo
+        columns (list): Colunas a carregar
+        simulate_if_missing (bool): Gera dados simulados se o arquivo não existir
         
     Returns:
         pd.DataFrame: Dataset carregado ou None se houver erro
     """
+    dtypes = {col: dtype for col, dtype in RFM_DTYPES.items() if col in columns}
+
+    cache_path = os.path.splitext(file_path)[0] + '.parquet'
     try:
-        df = pd.read_excel(file_path, engine='openpyxl')
+        # O cache só vale se não for mais antigo que o arquivo original (quando este existe)
+        cache_is_fresh = os.path.exists(cache_path) and (
+            not os.path.exists(file_path)
+            or os.path.getmtime(cache_path) >= os.path.getmtime(file_path)
+        )
+        if cache_is_fresh:
+            try:
+                df = pd.read_parquet(cache_path, columns=columns)
+                print(f"Dataset '{cache_path}' carregado do cache.")
+                print(f"Shape: {df.shape}")
+                return df
+            except Exception as e:
+                print(f"Aviso: Não foi possível usar o cache parquet ({e}), recarregando o arquivo original...")
+        elif os.path.exists(cache_path):
+            print("Aviso: Arquivo original mais recente que o cache parquet, recarregando...")
+
+        if file_path.lower().endswith('.csv'):
+            date_cols = [col for col in ['InvoiceDate'] if col in columns]
+            df = pd.read_csv(file_path, usecols=columns, dtype=dtypes, parse_dates=date_cols)
+        else:
+            df = pd.read_excel(file_path, engine='openpyxl', usecols=columns, dtype=dtypes)
         print(f"Dataset '{file_path}' carregado com sucesso.")
         print(f"Shape: {df.shape}")
+
+        # Colunas com tipos mistos (ex.: InvoiceNo) são gravadas como texto
+        object_cols = df.select_dtypes(include='object').columns
+        df[object_cols] = df[object_cols].astype('string')
+        try:
+            df.to_parquet(cache_path, index=False)
+            print(f"Cache salvo em: {cache_path}")
+        except Exception as e:
+            print(f"Aviso: Não foi possível salvar o cache parquet: {e}")
+
         return df
     except FileNotFoundError:
         print(f"ERRO: Arquivo '{file_path}' não encontrado.")
+        if not simulate_if_missing:
+            return None
         print("Criando dados simulados para demonstração...")
-        return create_simulated_data()
+        return create_simulated_data()[columns]
     except Exception as e:
         print(f"Erro ao carregar o arquivo: {e}")
         return None
@@ -75,10 +168,15 @@ def create_simulated_data():
     np.random.seed(42)
     n_transactions = 50000
     
+    # Códigos gerados em lote, sem chamadas ao gerador aleatório por linha
+    invoice_numbers = 531000 + np.arange(n_transactions)
+    stock_codes = 22000 + np.random.randint(0, 5000, n_transactions)
+    product_ids = np.random.randint(1, 1000, n_transactions)
+    
     retail_raw = pd.DataFrame({
-        'InvoiceNo': [f"53{1000 + i}" for i in range(n_transactions)],
-        'StockCode': [f"2{2000 + np.random.randint(0, 5000)}" for _ in range(n_transactions)],
-        'Description': [f"Product_{np.random.randint(1, 1000)}" for _ in range(n_transactions)],
+        'InvoiceNo': pd.Series(invoice_numbers).astype(str),
+        'StockCode': pd.Series(stock_codes).astype(str),
+        'Description': 'Product_' + pd.Series(product_ids).astype(str),
         'Quantity': np.random.randint(1, 100, n_transactions),
         'InvoiceDate': pd.date_range('2010-12-01', '2011-12-09', periods=n_transactions),
         'UnitPrice': np.random.uniform(0.5, 50.0, n_transactions),
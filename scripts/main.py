@@ -58,7 +58,9 @@ def main():
     # 5. Criando os modelos de segmentação
     print("\n5. Criando modelos de segmentação...")
     n_clusters = 5  # Pela imagem, pode ser: 3, 4 ou 5
-    scaler, kmeans_model, rfm_with_clusters = create_rfm_segmentation_models(rfm_data, n_clusters)
+    pipeline, rfm_with_clusters = create_rfm_segmentation_models(rfm_data, n_clusters)
+    scaler = pipeline.named_steps['scaler']
+    kmeans_model = pipeline.named_steps['kmeans']
     
     # 6. Salvando os modelos
     print("\n6. Salvando modelos...")
@@ -49,8 +49,8 @@ def load_models(models_dir="models"):
         scaler_path = os.path.join(models_dir, 'rfm_scaler.pkl')
         kmeans_path = os.path.join(models_dir, 'rfm_kmeans_model.pkl')
         
-        scaler = joblib.load(scaler_path)
-        kmeans_model = joblib.load(kmeans_path)
+        scaler = joblib.load(scaler_path, mmap_mode='r')
+        kmeans_model = joblib.load(kmeans_path, mmap_mode='r')
         
         print("Modelos carregados com sucesso!")
         return scaler, kmeans_model
@@ -98,7 +98,8 @@ def predict_customer_segment_from_transactions(transactions_df, scaler, kmeans_m
             return None
         
         # Prediz cluster
-        rfm_scaled = scaler.transform(rfm_data)
+        rfm_values = np.ascontiguousarray(rfm_data[['Recency', 'Frequency', 'Monetary']].to_numpy(), dtype=np.float32)
+        rfm_scaled = ((rfm_values - scaler.mean_) / scaler.scale_).astype(kmeans_model.cluster_centers_.dtype)
         cluster = kmeans_model.predict(rfm_scaled)[0]
         
         # Retorna resultado
@@ -28,15 +28,28 @@ class RFMCalculatorTransformer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X, y=None):
-        # Calculando o RFM
-        rfm_transformed = X.groupby('CustomerID').agg(
-            Recency=('InvoiceDate', lambda date: (self.snapshot_date_ - date.max()).days),
-            Frequency=('InvoiceNo', 'nunique'),
-            Monetary=('TotalPrice', 'sum')
-        ).reset_index()
-        
-        rfm_transformed.set_index('CustomerID', inplace=True)
-        
+        # Calculando o RFM (agregações nativas, sem lambda por grupo;
+        # o limpador já entrega os dados ordenados por CustomerID)
+        grouped = X.groupby('CustomerID', sort=False, observed=True)
+
+        # Frequência: pares (cliente, fatura) únicos contados por cliente
+        frequency = (X[['CustomerID', 'InvoiceNo']].drop_duplicates()
+                     .groupby('CustomerID', sort=False, observed=True).size())
+
+        # Monetário: TotalPrice é float32 por linha, mas a soma por cliente
+        # é acumulada em float64 para não perder os centavos
+        monetary = (X['TotalPrice'].astype('float64')
+                    .groupby(X['CustomerID'], sort=False, observed=True).sum())
+
+        rfm_transformed = pd.concat([
+            grouped['InvoiceDate'].max().rename('LastDate'),
+            frequency.rename('Frequency'),
+            monetary.rename('Monetary')
+        ], axis=1)
+
+        # Recência calculada de forma vetorizada a partir da última compra
+        rfm_transformed['Recency'] = (self.snapshot_date_ - rfm_transformed['LastDate']).dt.days
+
         # Retorna apenas as colunas RFM
         return rfm_transformed[['Recency', 'Frequency', 'Monetary']]
 